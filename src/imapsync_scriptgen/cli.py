@@ -1,6 +1,21 @@
 import argparse
 from .generator import ScriptGenerator, batch_lines
-from .utils import GeneratorConfig
+from .preflight import run_preflight
+from .utils import GeneratorConfig, PreflightConfig
+
+
+def non_negative_int(value: str) -> int:
+    number = int(value)
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"must be 0 or greater, got: {value}")
+    return number
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be 1 or greater, got: {value}")
+    return number
 
 
 def main():
@@ -11,18 +26,76 @@ def main():
     parser.add_argument("--split", type=int, default=30)
     parser.add_argument("--extra", default="")
     parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument(
+        "--parallel",
+        type=non_negative_int,
+        default=0,
+        help="Max concurrent imapsync jobs per script (0 = sequential)",
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Scan the input and report counts and output layout without generating",
+    )
+    parser.add_argument(
+        "--preflight",
+        action="store_true",
+        help="Check IMAP logins on both hosts instead of generating scripts",
+    )
+    parser.add_argument("--preflight-file", default="preflight.tsv")
+    parser.add_argument("--preflight-concurrency", type=positive_int, default=20)
+    parser.add_argument("--preflight-timeout", type=float, default=15.0)
+    parser.add_argument(
+        "--preflight-plain",
+        action="store_true",
+        help="Connect on port 143 without TLS, servers advertising LOGINDISABLED "
+        "are reported as ERROR",
+    )
+    parser.add_argument(
+        "--preflight-insecure",
+        action="store_true",
+        help="Do not verify TLS certificates",
+    )
+    parser.add_argument(
+        "--only-passed",
+        metavar="PREFLIGHT_FILE",
+        help="Only generate accounts marked PASS in a preflight results file, "
+        "FAIL and ERROR rows are skipped",
+    )
     args = parser.parse_args()
 
+    if args.preflight:
+        port = 143 if args.preflight_plain else 993
+        preflight_cfg = PreflightConfig(
+            host1=args.host1,
+            host2=args.host2,
+            port1=port,
+            port2=port,
+            use_ssl=not args.preflight_plain,
+            verify_ssl=not args.preflight_insecure,
+            concurrency=args.preflight_concurrency,
+            timeout=args.preflight_timeout,
+            results_file=args.preflight_file,
+        )
+        print(run_preflight(args.input_file, preflight_cfg).summary())
+        return
+
     cfg = GeneratorConfig(
         host1=args.host1,
         host2=args.host2,
         extra_args=args.extra,
         split=args.split,
         dry_run=args.dry_run,
+        parallel=args.parallel,
+        preflight_results=args.only_passed,
     )
 
     generator = ScriptGenerator(cfg)
 
+    if args.plan:
+        print(generator.plan_file(args.input_file).summary())
+        return
+
     with open(args.input_file) as fh:
         for lines_batch in batch_lines(generator.line_generator(fh), cfg.split):
             generator.write_output(lines_batch)
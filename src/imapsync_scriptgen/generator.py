@@ -1,11 +1,15 @@
 import re
 import os
-from typing import Generator, Iterable, List, Optional
+import time
+from typing import Generator, Iterable, List, Optional, Set, Tuple
 import logging
 from pathlib import Path
 
 from .utils import verify_host, batch_lines, GeneratorConfig
 from .parser import parse_credentials
+from .templates import render_parallel_script
+from .plan import PlanReport, scan_credentials
+from .preflight import load_passed
 
 logger = logging.getLogger("pymap_core")
 
@@ -37,6 +41,8 @@ class ScriptGenerator:
                 - destination: Output filename prefix.
                 - split: Number of lines per output file.
                 - dry_run: If True, disables file writing.
+                - parallel: Max concurrent jobs per script, 0 writes plain sequential scripts.
+                - preflight_results: Preflight results file, only PASS accounts are generated.
                 - pymap_logdir: Directory for log files.
 
         The constructor verifies hostnames, sets up output and logging parameters,
@@ -51,6 +57,14 @@ class ScriptGenerator:
         self.dest = cfg.destination
         self.line_count = cfg.split
         self.dry_run = cfg.dry_run
+        if cfg.parallel < 0:
+            raise ValueError(f"parallel must be 0 or greater, got: {cfg.parallel}")
+        self.parallel = cfg.parallel
+        self.passed_accounts: Optional[Set[Tuple[str, str]]] = (
+            None
+            if not cfg.preflight_results
+            else load_passed(cfg.preflight_results, cfg.host1, cfg.host2)
+        )
         self.file_count: int = 0
         # self.domains: List[str] = []
         # STATIC VARIABLES
@@ -124,6 +138,40 @@ class ScriptGenerator:
             logger.critical("Unhandled exception: %s", str(e), exc_info=True)
             raise
 
+    def plan_file(self, fpath: str) -> PlanReport:
+        """
+        Scans an input file at byte level and reports what a real run would produce,
+            without rendering any commands.
+
+        The generation time estimate times make_command over a sample of valid lines
+            and scales it to the full valid line count. Lines dropped by
+            preflight_results are counted as not passed and left out of the layout.
+        """
+        if not fpath or not os.path.isfile(fpath):
+            raise ValueError(f"File path was not supplied or invalid: {fpath}")
+
+        report = PlanReport(
+            host1=self.host1,
+            host2=self.host2,
+            destination=self.dest,
+            split=self.line_count,
+        )
+        start = time.perf_counter()
+        with open(fpath, "rb") as fh:
+            scan_credentials(fh, report, self.passed_accounts)
+        report.scan_seconds = time.perf_counter() - start
+
+        per_line = 0.0
+        if report.sample:
+            sample = [x.decode("utf-8", errors="replace") for x in report.sample]
+            start = time.perf_counter()
+            list(self.line_generator(sample))
+            per_line = (time.perf_counter() - start) / len(sample)
+            report.sample.clear()
+        report.estimated_seconds = report.scan_seconds + per_line * report.valid_lines
+
+        return report
+
     def process_strings(self, strings: List[str]) -> List[str]:
         """
         Processes data from a list with strings, uses self.line_generator to create the scripts,
@@ -163,6 +211,13 @@ class ScriptGenerator:
             logger.warning(str(e))
             return None
 
+        if (
+            self.passed_accounts is not None
+            and (user1, user2) not in self.passed_accounts
+        ):
+            logger.info("Skipping %s--%s, did not pass preflight", user1, user2)
+            return None
+
         # Generate final command
         return self.make_command(user1, pass1, user2, pass2)
 
@@ -189,6 +244,8 @@ class ScriptGenerator:
         Writes a batch of script lines to an output file.
 
         if self.dry_run is True, prints lines to stdout instead of writing.
+        if self.parallel is set, the batch is wrapped in a job-controlled script
+            that runs up to self.parallel commands at once.
         """
         dest_file = Path(f"{self.dest}_{self.file_count}.sh")
 
@@ -196,6 +253,17 @@ class ScriptGenerator:
             print(f"# Dry-run: would write {len(lines)} lines to {dest_file}")
             for line in lines:
                 print(line)
+        elif self.parallel:
+            dest_file.write_text(
+                render_parallel_script(lines, self.parallel), encoding="utf-8"
+            )
+            dest_file.chmod(0o755)
+            logger.debug(
+                "Wrote %d parallel jobs (max %d) to %s",
+                len(lines),
+                self.parallel,
+                dest_file,
+            )
         else:
             lines_to_write = [line + "\n" for line in lines]
             dest_file.write_text("".join(lines_to_write), encoding="utf-8")
@@ -0,0 +1,188 @@
+import logging
+from dataclasses import dataclass, field
+from typing import BinaryIO, Generator, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger("pymap_core.plan")
+
+# Number of valid lines kept aside to time real command generation
+CALIBRATION_SAMPLE = 1000
+
+
+@dataclass
+class PlanReport:
+    host1: str
+    host2: str
+    destination: str
+    split: int
+    total_lines: int = 0
+    valid_lines: int = 0
+    blank_lines: int = 0
+    rejected_lines: int = 0
+    invalid_utf8_lines: int = 0
+    first_invalid_utf8_line: Optional[int] = None
+    filtered_lines: int = 0
+    domains: Set[bytes] = field(default_factory=set)
+    domain_pairs: Set[Tuple[bytes, bytes]] = field(default_factory=set)
+    sample: List[bytes] = field(default_factory=list)
+    scan_seconds: float = 0.0
+    estimated_seconds: float = 0.0
+
+    @property
+    def will_fail(self) -> bool:
+        "A real run stops with UnicodeDecodeError on the first invalid UTF-8 line."
+        return self.invalid_utf8_lines > 0
+
+    @property
+    def file_count(self) -> int:
+        if self.will_fail or self.split <= 0:
+            return 0
+        return -(-self.valid_lines // self.split)
+
+    @property
+    def last_file_lines(self) -> int:
+        if not self.valid_lines:
+            return 0
+        return self.valid_lines - (self.file_count - 1) * self.split
+
+    def layout(self) -> Generator[Tuple[str, int], None, None]:
+        """
+        Yields (filename, line_count) for every output file a real run would write,
+            nothing if the run will fail.
+        """
+        for index in range(self.file_count):
+            lines = self.last_file_lines if index == self.file_count - 1 else self.split
+            yield f"{self.destination}_{index}.sh", lines
+
+    def summary(self) -> str:
+        """
+        Returns a human readable report, never includes credentials.
+        """
+        report = [
+            f"# Plan: {self.host1} -> {self.host2}",
+            f"Lines scanned:    {self.total_lines}",
+            f"Valid lines:      {self.valid_lines}",
+            f"Rejected lines:   {self.rejected_lines}",
+            f"  invalid UTF-8:  {self.invalid_utf8_lines}",
+            f"Not passed:       {self.filtered_lines}",
+            f"Blank lines:      {self.blank_lines}",
+            f"Distinct domains: {len(self.domains)}",
+            f"Domain pairs:     {len(self.domain_pairs)}",
+        ]
+        if self.will_fail:
+            report.append(
+                "Output files:     none, generation will fail: "
+                f"line {self.first_invalid_utf8_line} is not valid UTF-8"
+            )
+            return "\n".join(report)
+        if self.file_count:
+            report.append(
+                f"Output files:     {self.file_count} "
+                f"({self.destination}_0.sh .. {self.destination}_{self.file_count - 1}.sh), "
+                f"{min(self.split, self.valid_lines)} lines each, "
+                f"last file {self.last_file_lines} lines"
+            )
+        else:
+            report.append("Output files:     0")
+        report.append(f"Scan time:        {self.scan_seconds:.2f}s")
+        report.append(f"Est. generation:  {self.estimated_seconds:.2f}s")
+        return "\n".join(report)
+
+
+def domain_of(user: bytes) -> Optional[bytes]:
+    """
+    Byte level equivalent of ScriptGenerator.match_domain.
+    """
+    local, sep, domain = user.rpartition(b"@")
+    if sep and local and domain:
+        return domain
+    return None
+
+
+def universal_lines(fh: Iterable[bytes]) -> Generator[bytes, None, None]:
+    """
+    Splits a binary stream on \n, \r and \r\n like text mode universal newlines.
+    """
+    for line in fh:
+        if b"\r" in line:
+            yield from line.splitlines()
+        else:
+            yield line
+
+
+def split_fields(line: bytes) -> Optional[List[bytes]]:
+    """
+    Returns up to five whitespace separated fields, or None if line is not valid UTF-8.
+
+    ASCII lines are split as bytes, other lines are decoded first so that
+        unicode whitespace separates fields the same way parse_credentials does.
+    """
+    if line.isascii():
+        return line.split(None, 4)
+    try:
+        text = line.decode("utf-8")
+    except UnicodeDecodeError:
+        return None
+    return [x.encode("utf-8") for x in text.split(None, 4)]
+
+
+def scan_credentials(
+    fh: BinaryIO,
+    report: PlanReport,
+    accounts: Optional[Set[Tuple[str, str]]] = None,
+) -> PlanReport:
+    """
+    Counts credential lines from a binary stream without rendering any commands.
+
+    Applies the same field rules as parse_credentials: at least two whitespace
+        separated fields, with user2 defaulting to user1 when missing.
+        Lines that are not valid UTF-8 are rejected, a real run fails on them.
+        If accounts is given, valid lines whose (user1, user2) is not in it are
+        counted as not passed, like the generator's preflight filter.
+    """
+    total = valid = blank = rejected = invalid_utf8 = filtered = 0
+    domains = report.domains
+    domain_pairs = report.domain_pairs
+    sample = report.sample
+    first_invalid = report.first_invalid_utf8_line
+    for line in universal_lines(fh):
+        total += 1
+        parts = split_fields(line)
+        if parts is None:
+            rejected += 1
+            invalid_utf8 += 1
+            first_invalid = first_invalid or report.total_lines + total
+            continue
+        if len(parts) < 2:
+            if parts:
+                rejected += 1
+            else:
+                blank += 1
+            continue
+
+        user1 = parts[0]
+        user2 = parts[2] if len(parts) >= 4 else user1
+        if accounts is not None and (user1.decode(), user2.decode()) not in accounts:
+            filtered += 1
+            continue
+
+        valid += 1
+        if len(sample) < CALIBRATION_SAMPLE:
+            sample.append(line)
+
+        domain1 = domain_of(user1)
+        domain2 = domain_of(user2)
+        if domain1:
+            domains.add(domain1)
+        if domain2:
+            domains.add(domain2)
+        if domain1 or domain2:
+            domain_pairs.add((domain1 or b"", domain2 or b""))
+
+    report.total_lines += total
+    report.valid_lines += valid
+    report.blank_lines += blank
+    report.rejected_lines += rejected
+    report.invalid_utf8_lines += invalid_utf8
+    report.first_invalid_utf8_line = first_invalid
+    report.filtered_lines += filtered
+    return report
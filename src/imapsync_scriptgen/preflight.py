@@ -0,0 +1,432 @@
+import asyncio
+import contextlib
+import logging
+import os
+import ssl
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, TextIO, Tuple
+
+from .parser import parse_credentials
+from .utils import PreflightConfig
+
+logger = logging.getLogger("pymap_core.preflight")
+
+Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+# PASS: LOGIN accepted, FAIL: LOGIN answered with NO,
+# ERROR: the credentials could not be checked (transport or protocol error)
+PASS = "PASS"
+FAIL = "FAIL"
+ERROR = "ERROR"
+
+# Response codes of a NO that mean the credentials themselves were rejected,
+# any other code (UNAVAILABLE, CONTACTADMIN, EXPIRED...) is an ERROR
+FAIL_CODES = {None, "AUTHENTICATIONFAILED"}
+
+# First line of a results file, records which servers were checked
+HEADER_PREFIX = "# preflight"
+
+
+class LoginError(Exception):
+    """Raised when a connection can no longer be used for LOGIN attempts."""
+
+
+class ConnectionClosed(LoginError):
+    """Raised when the server closes the connection before answering."""
+
+
+@dataclass
+class PreflightStats:
+    checked: int = 0
+    passed: int = 0
+    failed: int = 0
+    errors: int = 0
+    skipped: int = 0
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        rate = self.checked / self.seconds * 60 if self.seconds else 0.0
+        return "\n".join(
+            [
+                f"Accounts checked: {self.checked}",
+                f"Passed:           {self.passed}",
+                f"Failed:           {self.failed}",
+                f"Errors:           {self.errors}",
+                f"Skipped lines:    {self.skipped}",
+                f"Elapsed:          {self.seconds:.2f}s ({rate:.0f} accounts/min)",
+            ]
+        )
+
+
+def quote(value: str) -> Optional[bytes]:
+    """
+    Returns value as an IMAP quoted string, or None if it has to be sent as a literal.
+    """
+    data = value.encode("utf-8")
+    # Control characters (CR, LF, NUL...) and 8-bit data are not allowed in quoted strings
+    if any(b < 0x20 or b > 0x7E for b in data):
+        return None
+    return b'"' + data.replace(b"\\", b"\\\\").replace(b'"', b'\\"') + b'"'
+
+
+def response_code(text: str) -> Optional[str]:
+    "Returns the RFC 5530 style [CODE] at the start of a response text, if any."
+    if not text.startswith("["):
+        return None
+    code, _, _ = text[1:].partition("]")
+    return code.split(" ", 1)[0].upper() or None
+
+
+def clean_detail(text: str) -> str:
+    "Keep details on a single results file column."
+    return " ".join(text.split())
+
+
+async def read_response(
+    reader: asyncio.StreamReader, tag: bytes, untagged: Optional[List[bytes]] = None
+) -> Tuple[str, str]:
+    """
+    Reads until a continuation request or the tagged response for tag,
+        collecting untagged lines into untagged if given. Returns (status, text).
+    """
+    while True:
+        line = await reader.readline()
+        if not line:
+            raise ConnectionClosed("connection closed by server")
+        if line.startswith(b"* ") and untagged is not None:
+            untagged.append(line)
+        elif line.startswith(b"+"):
+            return "+", line[1:].strip().decode("utf-8", errors="replace")
+        elif line.startswith(tag + b" "):
+            status, _, text = line.removeprefix(tag + b" ").partition(b" ")
+            return (
+                status.decode("ascii", errors="replace").upper(),
+                text.strip().decode("utf-8", errors="replace"),
+            )
+
+
+class HostPool:
+    """
+    Checks IMAP LOGINs against a single host with at most `limit` connections.
+
+    A successful LOGIN moves the connection to the authenticated state, so it is
+        logged out and closed. Connections that got a NO are still unauthenticated
+        and are kept for the next attempt.
+
+    check() returns PASS or FAIL only for an answered LOGIN, anything that prevents
+        the credentials from being checked (refused, timeout, TLS, BAD,
+        LOGINDISABLED, dropped connection) is an ERROR.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        limit: int,
+        timeout: float,
+        ssl_context: Optional[ssl.SSLContext] = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.semaphore = asyncio.Semaphore(limit)
+        self.idle: List[Connection] = []
+        self.tag_count: int = 0
+
+    def next_tag(self) -> bytes:
+        self.tag_count += 1
+        return b"A%d" % self.tag_count
+
+    async def connect(self) -> Connection:
+        reader, writer = await asyncio.open_connection(
+            self.host, self.port, ssl=self.ssl_context
+        )
+        greeting = await reader.readline()
+        if not greeting.startswith(b"* OK"):
+            await self.discard((reader, writer))
+            raise LoginError(
+                f"unexpected greeting: {greeting.strip().decode('utf-8', 'replace')}"
+            )
+
+        capabilities = [greeting]
+        if b"[CAPABILITY " not in greeting.upper():
+            tag = self.next_tag()
+            writer.write(tag + b" CAPABILITY\r\n")
+            await writer.drain()
+            await read_response(reader, tag, capabilities)
+        if any(b"LOGINDISABLED" in line.upper() for line in capabilities):
+            await self.discard((reader, writer))
+            raise LoginError("server advertises LOGINDISABLED, LOGIN requires TLS")
+        return reader, writer
+
+    async def discard(self, conn: Connection) -> None:
+        _, writer = conn
+        writer.close()
+        with contextlib.suppress(Exception):
+            await writer.wait_closed()
+
+    async def login(
+        self, conn: Connection, user: str, password: str
+    ) -> Tuple[str, str]:
+        """
+        Sends LOGIN, using synchronizing literals for values that cannot be quoted.
+        """
+        reader, writer = conn
+        tag = self.next_tag()
+        buffer = tag + b" LOGIN"
+        for value in (user, password):
+            quoted = quote(value)
+            if quoted is not None:
+                buffer += b" " + quoted
+                continue
+            data = value.encode("utf-8")
+            writer.write(buffer + b" {%d}\r\n" % len(data))
+            await writer.drain()
+            status, text = await read_response(reader, tag)
+            if status != "+":
+                return status, text
+            buffer = data
+        writer.write(buffer + b"\r\n")
+        await writer.drain()
+        return await read_response(reader, tag)
+
+    async def logout(self, conn: Connection) -> None:
+        _, writer = conn
+        with contextlib.suppress(Exception):
+            writer.write(self.next_tag() + b" LOGOUT\r\n")
+            await writer.drain()
+        await self.discard(conn)
+
+    async def check(self, user: str, password: str) -> Tuple[str, str]:
+        """
+        Returns (PASS|FAIL|ERROR, detail) for a single LOGIN attempt.
+
+        A reused connection may have been dropped by the server while idle,
+            in that case the attempt is retried on a fresh connection. Timeouts
+            are never retried, the server may still be counting the attempt.
+        """
+        async with self.semaphore:
+            while True:
+                reused = bool(self.idle)
+                conn: Optional[Connection] = None
+                try:
+                    async with asyncio.timeout(self.timeout):
+                        conn = self.idle.pop() if reused else await self.connect()
+                        status, text = await self.login(conn, user, password)
+                except (OSError, TimeoutError, LoginError) as e:
+                    if conn is not None:
+                        await self.discard(conn)
+                    if reused and isinstance(
+                        e, (ConnectionClosed, ConnectionResetError, BrokenPipeError)
+                    ):
+                        continue
+                    detail = str(e) or type(e).__name__
+                    return ERROR, clean_detail(f"{type(e).__name__}: {detail}")
+
+                if status == "OK":
+                    await self.logout(conn)
+                    return PASS, ""
+                if status == "NO":
+                    self.idle.append(conn)
+                    result = FAIL if response_code(text) in FAIL_CODES else ERROR
+                    return result, clean_detail(f"{status} {text}")
+                await self.discard(conn)
+                return ERROR, clean_detail(f"{status} {text}")
+
+    async def close(self) -> None:
+        while self.idle:
+            await self.discard(self.idle.pop())
+
+
+def make_ssl_context(cfg: PreflightConfig) -> Optional[ssl.SSLContext]:
+    if not cfg.use_ssl:
+        return None
+    context = ssl.create_default_context()
+    if not cfg.verify_ssl:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+async def check_account(
+    pools: List[HostPool], credentials: Tuple[str, str, str, str]
+) -> Tuple[str, List[str]]:
+    """
+    Checks both logins of a line concurrently, returns (status, details).
+
+    A rejected password on either host makes the line FAIL, otherwise any
+        unchecked host makes it ERROR.
+    """
+    user1, pass1, user2, pass2 = credentials
+    try:
+        results = await asyncio.gather(
+            pools[0].check(user1, pass1), pools[1].check(user2, pass2)
+        )
+    except Exception as e:
+        # Keep the worker alive, the producer would block on a dead queue
+        logger.critical("Unhandled exception: %s", str(e), exc_info=True)
+        return ERROR, [clean_detail(f"{type(e).__name__}: {e}")]
+
+    statuses = [status for status, _ in results]
+    details = [
+        f"host{index}: {detail}"
+        for index, (status, detail) in enumerate(results, start=1)
+        if status != PASS
+    ]
+    if FAIL in statuses:
+        return FAIL, details
+    if ERROR in statuses:
+        return ERROR, details
+    return PASS, details
+
+
+async def worker(
+    queue: asyncio.Queue, pools: List[HostPool], stats: PreflightStats, out: TextIO
+) -> None:
+    """
+    Consumes credentials from queue until it gets None, writing one result row each.
+    """
+    while True:
+        item = await queue.get()
+        if item is None:
+            return
+        user1, _, user2, _ = item
+        status, details = await check_account(pools, item)
+        stats.checked += 1
+        if status == PASS:
+            stats.passed += 1
+        elif status == FAIL:
+            stats.failed += 1
+        else:
+            stats.errors += 1
+        out.write(f"{status}\t{user1}\t{user2}\t{'; '.join(details)}\n")
+
+
+async def preflight_async(
+    lines: Iterable[str], cfg: PreflightConfig, out: TextIO
+) -> PreflightStats:
+    """
+    Checks user1/pass1 against host1 and user2/pass2 against host2 for every line.
+
+    Results are streamed to out as: PASS|FAIL|ERROR<TAB>user1<TAB>user2<TAB>detail
+        a line only passes if both logins succeed. The first line is a header
+        recording host1/host2, load_passed checks it against the generation hosts.
+    """
+    ssl_context = make_ssl_context(cfg)
+    pools = [
+        HostPool(host, port, cfg.concurrency, cfg.timeout, ssl_context)
+        for host, port in ((cfg.host1, cfg.port1), (cfg.host2, cfg.port2))
+    ]
+    stats = PreflightStats()
+    queue: asyncio.Queue = asyncio.Queue(maxsize=cfg.concurrency * 2)
+    start = time.perf_counter()
+    out.write(
+        f"{HEADER_PREFIX} host1={cfg.host1} port1={cfg.port1}"
+        f" host2={cfg.host2} port2={cfg.port2}\n"
+    )
+
+    workers = [
+        asyncio.create_task(worker(queue, pools, stats, out))
+        for _ in range(cfg.concurrency)
+    ]
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            credentials = parse_credentials(line)
+        except ValueError as e:
+            logger.warning(str(e))
+            stats.skipped += 1
+            continue
+        await queue.put(credentials)
+
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+    for pool in pools:
+        await pool.close()
+
+    stats.seconds = time.perf_counter() - start
+    return stats
+
+
+def run_preflight(fpath: str, cfg: PreflightConfig) -> PreflightStats:
+    """
+    Runs the preflight checks for an input file, writing results to cfg.results_file.
+    """
+    if not fpath or not os.path.isfile(fpath):
+        raise ValueError(f"File path was not supplied or invalid: {fpath}")
+
+    with (
+        open(fpath, "r", encoding="utf-8") as fh,
+        open(cfg.results_file, "w", encoding="utf-8", buffering=1) as out,
+    ):
+        return asyncio.run(preflight_async(fh, cfg, out))
+
+
+def parse_header(line: str) -> Dict[str, str]:
+    "Returns the key=value pairs of a results file header line."
+    return dict(
+        field.split("=", 1)
+        for field in line.removeprefix(HEADER_PREFIX).split()
+        if "=" in field
+    )
+
+
+def check_hosts(fpath: str, header: Dict[str, str], host1: str, host2: str) -> None:
+    """
+    Raises ValueError if a results file was checked against other servers.
+    """
+    if not header:
+        logger.warning(
+            "%s has no preflight header, cannot verify it was checked against %s/%s",
+            fpath,
+            host1,
+            host2,
+        )
+        return
+    checked = (header.get("host1"), header.get("host2"))
+    if checked != (host1, host2):
+        raise ValueError(
+            f"Preflight results in {fpath} were checked against "
+            f"{checked[0]}/{checked[1]}, not {host1}/{host2}"
+        )
+
+
+def load_passed(
+    fpath: str, host1: Optional[str] = None, host2: Optional[str] = None
+) -> Set[Tuple[str, str]]:
+    """
+    Returns the (user1, user2) pairs marked PASS in a preflight results file.
+
+    FAIL and ERROR rows are both left out, ERROR rows are logged as a warning
+        since those accounts were never checked and need another preflight run.
+    If host1 and host2 are given, the file must have been checked against them.
+    """
+    passed: Set[Tuple[str, str]] = set()
+    errors = 0
+    header: Dict[str, str] = {}
+    with open(fpath, "r", encoding="utf-8") as fh:
+        for line in fh:
+            if line.startswith(HEADER_PREFIX):
+                header = parse_header(line)
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 3:
+                continue
+            if fields[0] == PASS:
+                passed.add((fields[1], fields[2]))
+            elif fields[0] == ERROR:
+                errors += 1
+    if host1 is not None and host2 is not None:
+        check_hosts(fpath, header, host1, host2)
+    if errors:
+        logger.warning(
+            "%d accounts in %s could not be checked (ERROR) and will be skipped,"
+            " re-run preflight for them",
+            errors,
+            fpath,
+        )
+    return passed
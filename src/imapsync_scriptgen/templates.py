@@ -0,0 +1,91 @@
+import re
+import shlex
+from typing import List
+
+# Pulls the --logfile value out of a generated command, used as a job label
+# so the results file identifies accounts without exposing passwords
+LOGFILE_IDENTIFIER = re.compile(r"--logfile=(?P<logfile>\S+)")
+
+# Plain POSIX sh: jobs are throttled with a FIFO holding MAX_JOBS tokens,
+# each job takes a token before starting and puts it back when it exits
+PARALLEL_HEADER = """#!/bin/sh
+# Runs up to MAX_JOBS imapsync jobs concurrently.
+# Exit statuses are recorded in RESULTS_FILE as: job_id<TAB>status<TAB>label
+# imapsync output goes to its --logfile, stderr is kept on the terminal
+# Both can be overridden at runtime, e.g.: MAX_JOBS=8 sh sync_0.sh
+MAX_JOBS="${MAX_JOBS:-__MAX_JOBS__}"
+RESULTS_FILE="${RESULTS_FILE:-${0%.sh}.results}"
+
+case "$MAX_JOBS" in
+    ''|*[!0-9]*|0*)
+        echo "MAX_JOBS must be a positive integer, got: '$MAX_JOBS'" >&2
+        exit 2
+        ;;
+esac
+
+TOKEN_DIR="$(mktemp -d)" || exit 2
+mkfifo "$TOKEN_DIR/tokens" || exit 2
+exec 3<> "$TOKEN_DIR/tokens"
+rm -rf "$TOKEN_DIR"
+i=0
+while [ "$i" -lt "$MAX_JOBS" ]; do
+    echo >&3
+    i=$((i + 1))
+done
+
+: > "$RESULTS_FILE"
+
+run_job() {
+    job_id="$1"
+    job_label="$2"
+    shift 2
+    read -r _ <&3
+    (
+        "$@" > /dev/null 3>&-
+        printf '%s\\t%s\\t%s\\n' "$job_id" "$?" "$job_label" >> "$RESULTS_FILE"
+        echo >&3
+    ) &
+}
+
+"""
+
+PARALLEL_FOOTER = """
+wait
+awk -F '\\t' '
+    { total++ }
+    $2 != 0 { failed++; print "FAILED job " $1 " (exit " $2 "): " $3 }
+    END {
+        printf "Summary: %d jobs, %d succeeded, %d failed\\n", total, total - failed, failed
+        exit (failed > 0)
+    }
+' "$RESULTS_FILE"
+"""
+
+
+def job_label(line: str, job_id: int) -> str:
+    """
+    Returns the logfile name of a generated command, or a generic label if it has none.
+    """
+    has_match = LOGFILE_IDENTIFIER.search(line)
+    if has_match:
+        return has_match.group("logfile")
+    return f"job-{job_id}"
+
+
+def render_parallel_script(lines: List[str], max_jobs: int) -> str:
+    """
+    Wraps a batch of commands in a bash script with built-in job control.
+
+    Each command becomes a `run_job` call, at most max_jobs run at once,
+        every exit status is appended to a results file and a summary is
+        printed once all jobs finish. The script exits non-zero if any job failed.
+    """
+    if max_jobs < 1:
+        raise ValueError(f"max_jobs must be at least 1, got: {max_jobs}")
+
+    jobs = [
+        f"run_job {job_id} {shlex.quote(job_label(line, job_id))} {line}\n"
+        for job_id, line in enumerate(lines, start=1)
+    ]
+    header = PARALLEL_HEADER.replace("__MAX_JOBS__", str(max_jobs))
+    return header + "".join(jobs) + PARALLEL_FOOTER
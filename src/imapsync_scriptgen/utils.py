@@ -14,11 +14,30 @@ class GeneratorConfig:
     destination: str = "sync"
     split: int = 30
     dry_run: bool = False
+    parallel: int = 0
+    preflight_results: Optional[str] = None
     logdir: str = "/var/log/pymap"
     additional_known_hosts: Optional[List[List[str]]] = field(default_factory=list)
     config: Optional[Dict] = field(default_factory=dict)
 
 
+@dataclass
+class PreflightConfig:
+    host1: str
+    host2: str
+    port1: int = 993
+    port2: int = 993
+    use_ssl: bool = True
+    verify_ssl: bool = True
+    concurrency: int = 20
+    timeout: float = 15.0
+    results_file: str = "preflight.tsv"
+
+    def __post_init__(self) -> None:
+        if self.concurrency < 1:
+            raise ValueError(f"concurrency must be at least 1, got: {self.concurrency}")
+
+
 def verify_host(hostname: str, known_hosts: Optional[List[List[str]]] = None) -> str:
     """
     Checks if a hostname matches any regex pattern in a list and appends a string if matched.
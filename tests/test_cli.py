@@ -1,3 +1,4 @@
+import pytest
 from src.imapsync_scriptgen.cli import main
 
 
@@ -41,3 +42,112 @@ def test_cli_runs(monkeypatch, tmp_path):
     assert called["cfg"].host1 == "old.example.com"
     assert called["cfg"].dry_run is True
     assert called["lines"] == ["user@example.com pass"]
+
+
+def test_cli_plan(monkeypatch, tmp_path, capsys):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("user@example.com S3cretPw\nbroken\n")
+    monkeypatch.chdir(tmp_path)
+
+    monkeypatch.setattr(
+        "sys.argv",
+        [
+            "imapsync-gen",
+            str(input_file),
+            "--host1",
+            "old.example.com",
+            "--host2",
+            "new.example.com",
+            "--plan",
+        ],
+    )
+
+    main()
+
+    out = capsys.readouterr().out
+    assert "# Plan: old.example.com -> new.example.com" in out
+    assert "Valid lines:      1" in out
+    assert "Rejected lines:   1" in out
+    assert "S3cretPw" not in out
+    assert not (tmp_path / "sync_0.sh").exists()
+
+
+def test_cli_preflight(monkeypatch, tmp_path, capsys):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("user@example.com pass\n")
+
+    monkeypatch.setattr(
+        "sys.argv",
+        [
+            "imapsync-gen",
+            str(input_file),
+            "--host1",
+            "old.example.com",
+            "--host2",
+            "new.example.com",
+            "--preflight",
+            "--preflight-plain",
+            "--preflight-concurrency",
+            "5",
+            "--preflight-file",
+            str(tmp_path / "out.tsv"),
+        ],
+    )
+
+    called = {}
+
+    class DummyStats:
+        def summary(self):
+            return "Accounts checked: 1"
+
+    def dummy_run_preflight(fpath, cfg):
+        called["fpath"] = fpath
+        called["cfg"] = cfg
+        return DummyStats()
+
+    monkeypatch.setattr("src.imapsync_scriptgen.cli.run_preflight", dummy_run_preflight)
+
+    main()
+
+    cfg = called["cfg"]
+    assert called["fpath"] == str(input_file)
+    assert (cfg.host1, cfg.host2) == ("old.example.com", "new.example.com")
+    assert (cfg.port1, cfg.port2, cfg.use_ssl) == (143, 143, False)
+    assert cfg.concurrency == 5
+    assert cfg.results_file == str(tmp_path / "out.tsv")
+    assert "Accounts checked: 1" in capsys.readouterr().out
+
+
+def test_cli_rejects_negative_parallel(monkeypatch, tmp_path, capsys):
+    monkeypatch.setattr(
+        "sys.argv",
+        ["imapsync-gen", "in.txt", "--host1", "a", "--host2", "b", "--parallel", "-1"],
+    )
+
+    with pytest.raises(SystemExit):
+        main()
+
+    assert "must be 0 or greater" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("value", ["0", "-1"])
+def test_cli_rejects_preflight_concurrency(monkeypatch, capsys, value):
+    monkeypatch.setattr(
+        "sys.argv",
+        [
+            "imapsync-gen",
+            "in.txt",
+            "--host1",
+            "a",
+            "--host2",
+            "b",
+            "--preflight",
+            "--preflight-concurrency",
+            value,
+        ],
+    )
+
+    with pytest.raises(SystemExit):
+        main()
+
+    assert "must be 1 or greater" in capsys.readouterr().err
@@ -159,3 +159,108 @@ def test_process_file(gen, tmp_path, monkeypatch):
 def test_process_file_invalid(gen):
     with pytest.raises(ValueError):
         gen.process_file("not_a_file")
+
+
+def test_write_output_parallel(cfg, tmp_path, monkeypatch):
+    cfg.parallel = 3
+    gen = ScriptGenerator(cfg)
+
+    monkeypatch.chdir(tmp_path)
+
+    gen.write_output(["cmd1", "cmd2"])
+
+    expected_file = tmp_path / "sync_0.sh"
+    contents = expected_file.read_text()
+    assert contents.startswith("#!/bin/sh")
+    assert 'MAX_JOBS="${MAX_JOBS:-3}"' in contents
+    assert "run_job 1 job-1 cmd1" in contents
+    assert "run_job 2 job-2 cmd2" in contents
+    assert expected_file.stat().st_mode & 0o111
+
+
+def test_parallel_negative_rejected(cfg):
+    cfg.parallel = -1
+    with pytest.raises(ValueError):
+        ScriptGenerator(cfg)
+
+
+# Test plan_file
+def test_plan_file(gen, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    f = tmp_path / "input.txt"
+    f.write_text("john@a.com p1\njeff@b.com p2\ninvalid\ncoral@a.com p3\n")
+
+    report = gen.plan_file(str(f))
+
+    assert report.valid_lines == 3
+    assert report.rejected_lines == 1
+    assert report.domains == {b"a.com", b"b.com"}
+    assert list(report.layout()) == [("sync_0.sh", 2), ("sync_1.sh", 1)]
+    assert report.estimated_seconds >= report.scan_seconds
+    assert report.sample == []
+
+    # Nothing is generated and no credentials are reported
+    assert list(tmp_path.iterdir()) == [f]
+    assert "p1" not in report.summary()
+
+
+def test_plan_file_matches_text_mode_generation(gen, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    f = tmp_path / "input.txt"
+    f.write_bytes(b"john p1\rjeff p2\r\ncoral p3\n")
+
+    report = gen.plan_file(str(f))
+    gen.process_file(str(f))
+
+    assert report.valid_lines == 3
+    assert list(report.layout()) == [("sync_0.sh", 2), ("sync_1.sh", 1)]
+    assert len((tmp_path / "sync_0.sh").read_text().splitlines()) == 2
+    assert len((tmp_path / "sync_1.sh").read_text().splitlines()) == 1
+
+
+def test_plan_file_reports_invalid_utf8(gen, tmp_path):
+    f = tmp_path / "input.txt"
+    f.write_bytes(b"john p1\njeff p\xff2\n")
+
+    report = gen.plan_file(str(f))
+
+    assert report.valid_lines == 1
+    assert report.invalid_utf8_lines == 1
+    assert report.first_invalid_utf8_line == 2
+    assert list(report.layout()) == []
+    summary = report.summary()
+    assert "invalid UTF-8:  1" in summary
+    assert "generation will fail: line 2 is not valid UTF-8" in summary
+    assert "sync_0.sh" not in summary
+    with pytest.raises(UnicodeDecodeError):
+        gen.process_file(str(f))
+
+
+def test_plan_file_applies_preflight_results(cfg, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    results = tmp_path / "preflight.tsv"
+    results.write_text(
+        "# preflight host1=imap.source.tld port1=993 host2=imap.dest.tld port2=993\n"
+        "PASS\tjohn\tjohn\t\nFAIL\tjeff\tjeff\tNO\n"
+    )
+    cfg.preflight_results = str(results)
+    gen = ScriptGenerator(cfg)
+
+    f = tmp_path / "input.txt"
+    f.write_text("john p1\njeff p2\ncoral p3\n")
+
+    report = gen.plan_file(str(f))
+    gen.process_file(str(f))
+
+    assert report.valid_lines == 1
+    assert report.filtered_lines == 2
+    assert list(report.layout()) == [("sync_0.sh", 1)]
+    assert (tmp_path / "sync_0.sh").read_text().count("imapsync") == 1
+    assert not (tmp_path / "sync_1.sh").exists()
+
+
+def test_plan_file_invalid(gen):
+    with pytest.raises(ValueError):
+        gen.plan_file("not_a_file")
@@ -0,0 +1,133 @@
+import io
+
+import pytest
+from src.imapsync_scriptgen.plan import PlanReport, domain_of, scan_credentials
+
+from .fixtures import cfg as CONFIG, gen as GEN
+
+gen = GEN
+cfg = CONFIG
+
+
+def make_report(split=2):
+    return PlanReport(host1="h1", host2="h2", destination="sync", split=split)
+
+
+# Test domain_of
+@pytest.mark.parametrize(
+    "user, expected",
+    [
+        (b"user@domain.com", b"domain.com"),
+        (b"no-at-symbol.com.pt", None),
+        (b"@domain.com", None),
+        (b"user@", None),
+        (b"john.doe@sub.domain.co.uk", b"sub.domain.co.uk"),
+    ],
+)
+def test_domain_of(user, expected):
+    assert domain_of(user) == expected
+
+
+# Test scan_credentials
+def test_scan_credentials_counts():
+    data = (
+        b"a@one.com p1\n"
+        b"b@one.com p2 b@two.org p3\n"
+        b"\n"
+        b"   \t\n"
+        b"invalid\n"
+        b"c@three.net\tp4 c@two.org p5 extra\n"
+        b"nodomain p6\n"
+    )
+    report = scan_credentials(io.BytesIO(data), make_report())
+
+    assert report.total_lines == 7
+    assert report.valid_lines == 4
+    assert report.blank_lines == 2
+    assert report.rejected_lines == 1
+    assert report.domains == {b"one.com", b"two.org", b"three.net"}
+    assert report.domain_pairs == {
+        (b"one.com", b"one.com"),
+        (b"one.com", b"two.org"),
+        (b"three.net", b"two.org"),
+    }
+
+
+def test_scan_credentials_rejects_invalid_utf8():
+    data = b"a@one.com p\xff1\nb@two.org p\xc3\xa42\n"
+
+    report = scan_credentials(io.BytesIO(data), make_report())
+
+    assert report.valid_lines == 1
+    assert report.rejected_lines == 1
+    assert report.invalid_utf8_lines == 1
+    assert report.first_invalid_utf8_line == 1
+    assert report.will_fail
+    assert report.file_count == 0
+    assert report.domains == {b"two.org"}
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"a p1\rb p2\n",
+        b"a p1\r\nb p2\r\n",
+        b"a p1\nb p2",
+        b"a p1\rb p2\r",
+    ],
+)
+def test_scan_credentials_universal_newlines(data):
+    report = scan_credentials(io.BytesIO(data), make_report())
+
+    assert report.total_lines == 2
+    assert report.valid_lines == 2
+
+
+def test_scan_credentials_unicode_whitespace():
+    # parse_credentials splits on any unicode whitespace
+    data = "a@one.com\u00a0p1\n".encode("utf-8")
+
+    report = scan_credentials(io.BytesIO(data), make_report())
+
+    assert report.valid_lines == 1
+    assert report.domains == {b"one.com"}
+
+
+def test_scan_credentials_matches_generator(gen):
+    lines = ["a1 p1", "a2", "", "a3 p3 u3 p3", "  ", "a4 p4"]
+    data = "\n".join(lines).encode("utf-8")
+
+    report = scan_credentials(io.BytesIO(data), make_report())
+
+    assert report.valid_lines == len(gen.process_strings(lines))
+
+
+# Test PlanReport layout
+@pytest.mark.parametrize(
+    "valid, split, expected",
+    [
+        (0, 2, []),
+        (1, 2, [("sync_0.sh", 1)]),
+        (4, 2, [("sync_0.sh", 2), ("sync_1.sh", 2)]),
+        (5, 2, [("sync_0.sh", 2), ("sync_1.sh", 2), ("sync_2.sh", 1)]),
+    ],
+)
+def test_plan_report_layout(valid, split, expected):
+    report = make_report(split)
+    report.valid_lines = valid
+
+    assert report.file_count == len(expected)
+    assert list(report.layout()) == expected
+
+
+def test_plan_report_summary():
+    report = make_report()
+    report.valid_lines = 3
+    report.domains = {b"one.com"}
+
+    summary = report.summary()
+    assert "# Plan: h1 -> h2" in summary
+    assert "Valid lines:      3" in summary
+    assert "Distinct domains: 1" in summary
+    assert "Output files:     2 (sync_0.sh .. sync_1.sh)" in summary
+    assert "last file 1 lines" in summary
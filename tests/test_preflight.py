@@ -0,0 +1,495 @@
+import asyncio
+import io
+import threading
+
+import pytest
+from src.imapsync_scriptgen.generator import ScriptGenerator
+from src.imapsync_scriptgen.preflight import (
+    ERROR,
+    FAIL,
+    PASS,
+    HostPool,
+    load_passed,
+    preflight_async,
+    quote,
+    response_code,
+    run_preflight,
+)
+from src.imapsync_scriptgen.utils import GeneratorConfig, PreflightConfig
+
+
+class FakeIMAPServer:
+    """
+    Minimal IMAP server supporting CAPABILITY, LOGIN (quoted strings and literals)
+    and LOGOUT. Users in `slow` get their LOGIN answered after `delay` seconds,
+    users in `bad` get a BAD response, users in `no_texts` get NO with that text.
+    """
+
+    def __init__(
+        self,
+        accounts,
+        delay=0.0,
+        slow=None,
+        bad=(),
+        login_disabled=False,
+        no_texts=None,
+    ):
+        self.accounts = accounts
+        self.no_texts = no_texts or {}
+        self.delay = delay
+        self.slow = slow
+        self.bad = bad
+        self.login_disabled = login_disabled
+        self.writers = set()
+        self.connections = 0
+        self.active = 0
+        self.max_active = 0
+        self.logins = []
+        self.server = None
+
+    @property
+    def port(self):
+        return self.server.sockets[0].getsockname()[1]
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self
+
+    def drop_connections(self):
+        for writer in self.writers:
+            writer.close()
+
+    async def stop(self):
+        self.drop_connections()
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def read_args(self, reader, writer, rest):
+        args = []
+        while rest:
+            if rest.startswith(b'"'):
+                value = bytearray()
+                escaped = False
+                for index, char in enumerate(rest):
+                    if index == 0:
+                        continue
+                    if escaped:
+                        value.append(char)
+                        escaped = False
+                    elif char == ord("\\"):
+                        escaped = True
+                    elif char == ord('"'):
+                        break
+                    else:
+                        value.append(char)
+                args.append(value.decode("utf-8"))
+                end = index + 1
+                rest = rest[end:].lstrip(b" ")
+            elif rest.startswith(b"{"):
+                size = int(rest.strip(b"{}"))
+                writer.write(b"+ Ready for literal data\r\n")
+                await writer.drain()
+                args.append((await reader.readexactly(size)).decode("utf-8"))
+                rest = (await reader.readline()).rstrip(b"\r\n").lstrip(b" ")
+            else:
+                value, _, rest = rest.partition(b" ")
+                args.append(value.decode("utf-8"))
+        return args
+
+    async def login(self, args):
+        self.logins.append(tuple(args))
+        if self.slow is None or args[0] in self.slow:
+            await asyncio.sleep(self.delay)
+        if self.login_disabled:
+            return b"NO LOGIN is disabled"
+        if args[0] in self.bad:
+            return b"BAD Command error"
+        if args[0] in self.no_texts:
+            return b"NO " + self.no_texts[args[0]]
+        if self.accounts.get(args[0]) == args[1]:
+            return b"OK LOGIN completed"
+        return b"NO [AUTHENTICATIONFAILED] Invalid"
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        self.writers.add(writer)
+        writer.write(b"* OK Fake IMAP ready\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                tag, _, rest = line.rstrip(b"\r\n").partition(b" ")
+                command, _, rest = rest.partition(b" ")
+                if command.upper() == b"LOGOUT":
+                    writer.write(b"* BYE\r\n" + tag + b" OK LOGOUT completed\r\n")
+                    break
+                if command.upper() == b"CAPABILITY":
+                    disabled = b" LOGINDISABLED" if self.login_disabled else b""
+                    writer.write(b"* CAPABILITY IMAP4rev1" + disabled + b"\r\n")
+                    writer.write(tag + b" OK CAPABILITY completed\r\n")
+                    continue
+                args = await self.read_args(reader, writer, rest)
+                writer.write(tag + b" " + await self.login(args) + b"\r\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.active -= 1
+            self.writers.discard(writer)
+            writer.close()
+
+
+def make_cfg(server1, server2, concurrency=4):
+    return PreflightConfig(
+        host1="127.0.0.1",
+        host2="127.0.0.1",
+        port1=server1.port,
+        port2=server2.port,
+        use_ssl=False,
+        concurrency=concurrency,
+        timeout=5.0,
+    )
+
+
+def run_against(accounts1, accounts2, lines, concurrency=4, delay=0.0):
+    async def runner():
+        server1 = await FakeIMAPServer(accounts1, delay).start()
+        server2 = await FakeIMAPServer(accounts2, delay).start()
+        out = io.StringIO()
+        try:
+            cfg = make_cfg(server1, server2, concurrency)
+            stats = await preflight_async(lines, cfg, out)
+        finally:
+            await server1.stop()
+            await server2.stop()
+        return stats, out.getvalue(), server1, server2
+
+    return asyncio.run(runner())
+
+
+# Test quote
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("simple", b'"simple"'),
+        ('pa"ss', b'"pa\\"ss"'),
+        ("back\\slash", b'"back\\\\slash"'),
+        ("päss", None),
+        ("line\nbreak", None),
+    ],
+)
+def test_quote(value, expected):
+    assert quote(value) == expected
+
+
+# Test response_code
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("Invalid credentials", None),
+        ("[AUTHENTICATIONFAILED] Invalid", "AUTHENTICATIONFAILED"),
+        ("[unavailable] Backend down", "UNAVAILABLE"),
+        ("[BADCHARSET (UTF-8)] text", "BADCHARSET"),
+        ("[] empty", None),
+    ],
+)
+def test_response_code(text, expected):
+    assert response_code(text) == expected
+
+
+# Test preflight_async
+def test_preflight_pass_and_fail():
+    accounts1 = {"a@src.com": "p1", "b@src.com": "p2"}
+    accounts2 = {"a@dst.com": "x1", "b@dst.com": "x2"}
+    lines = [
+        "a@src.com p1 a@dst.com x1\n",
+        "b@src.com wrong b@dst.com x2\n",
+        "\n",
+        "invalid\n",
+        "b@src.com p2 b@dst.com wrong\n",
+    ]
+
+    stats, out, _, _ = run_against(accounts1, accounts2, lines)
+
+    assert (stats.checked, stats.passed, stats.failed, stats.skipped) == (3, 1, 2, 1)
+    header, *lines = out.splitlines()
+    assert header.startswith("# preflight host1=127.0.0.1 port1=")
+    rows = sorted(row.split("\t") for row in lines)
+    assert rows == [
+        ["FAIL", "b@src.com", "b@dst.com", "host1: NO [AUTHENTICATIONFAILED] Invalid"],
+        ["FAIL", "b@src.com", "b@dst.com", "host2: NO [AUTHENTICATIONFAILED] Invalid"],
+        ["PASS", "a@src.com", "a@dst.com", ""],
+    ]
+
+
+def test_preflight_literal_credentials():
+    password = 'päss"quoted"\\word'
+    accounts = {"user": password}
+
+    stats, _, server1, _ = run_against(accounts, accounts, [f"user {password}"])
+
+    assert stats.passed == 1
+    assert server1.logins == [("user", password)]
+
+
+def test_preflight_reuses_connections_within_limit():
+    lines = [f"user{i} wrong" for i in range(40)]
+
+    stats, _, server1, server2 = run_against({}, {}, lines, concurrency=3, delay=0.01)
+
+    assert stats.failed == 40
+    for server in (server1, server2):
+        assert server.max_active <= 3
+        # Failed logins leave the connection unauthenticated so it gets reused
+        assert server.connections <= 3
+        assert len(server.logins) == 40
+
+
+def test_preflight_successful_login_is_not_reused():
+    accounts = {f"user{i}": "ok" for i in range(5)}
+    lines = [f"user{i} ok" for i in range(5)]
+
+    stats, _, server1, _ = run_against(accounts, accounts, lines, concurrency=1)
+
+    assert stats.passed == 5
+    assert server1.connections == 5
+
+
+def test_preflight_connection_refused_is_error():
+    async def runner():
+        server = await FakeIMAPServer({}).start()
+        port = server.port
+        await server.stop()
+        pool = HostPool("127.0.0.1", port, 1, 5.0)
+        return await pool.check("user", "pass")
+
+    status, detail = asyncio.run(runner())
+
+    assert status == ERROR
+    assert "ConnectionRefusedError" in detail
+
+
+def test_preflight_host_outage_is_not_fail():
+    async def runner():
+        server1 = await FakeIMAPServer({"a": "p1", "b": "p2"}).start()
+        server2 = await FakeIMAPServer({}).start()
+        cfg = make_cfg(server1, server2)
+        await server2.stop()
+        out = io.StringIO()
+        stats = await preflight_async(["a p1", "b wrong"], cfg, out)
+        await server1.stop()
+        return stats, out.getvalue()
+
+    stats, out = asyncio.run(runner())
+
+    assert (stats.passed, stats.failed, stats.errors) == (0, 1, 1)
+    rows = {row.split("\t")[1]: row.split("\t")[0] for row in out.splitlines()[1:]}
+    # A rejected password is a FAIL even if the other host could not be checked
+    assert rows == {"a": ERROR, "b": FAIL}
+
+
+def test_preflight_bad_response_is_error():
+    async def runner():
+        server = await FakeIMAPServer({"u": "p"}, bad=("u",)).start()
+        status = await HostPool("127.0.0.1", server.port, 1, 5.0).check("u", "p")
+        await server.stop()
+        return status
+
+    status, detail = asyncio.run(runner())
+
+    assert status == ERROR
+    assert detail == "BAD Command error"
+
+
+def test_preflight_login_disabled_is_error():
+    async def runner():
+        server = await FakeIMAPServer({"u": "p"}, login_disabled=True).start()
+        result = await HostPool("127.0.0.1", server.port, 1, 5.0).check("u", "p")
+        await server.stop()
+        return result, server.logins
+
+    (status, detail), logins = asyncio.run(runner())
+
+    assert status == ERROR
+    assert "LOGINDISABLED" in detail
+    # LOGIN is never sent in cleartext to a server that disabled it
+    assert logins == []
+
+
+def test_preflight_timeout_is_not_retried():
+    async def runner():
+        server = await FakeIMAPServer({}, delay=1.0, slow=("slow",)).start()
+        pool = HostPool("127.0.0.1", server.port, 1, 0.3)
+        first = await pool.check("fast", "wrong")
+        second = await pool.check("slow", "wrong")
+        await pool.close()
+        await server.stop()
+        return first, second, server
+
+    first, second, server = asyncio.run(runner())
+
+    assert first[0] == FAIL
+    assert second[0] == ERROR
+    assert "TimeoutError" in second[1]
+    assert [user for user, _ in server.logins] == ["fast", "slow"]
+
+
+def test_preflight_dropped_idle_connection_is_retried():
+    async def runner():
+        server = await FakeIMAPServer({"u2": "p2"}).start()
+        pool = HostPool("127.0.0.1", server.port, 1, 5.0)
+        first = await pool.check("u1", "wrong")
+        server.drop_connections()
+        await asyncio.sleep(0.05)
+        second = await pool.check("u2", "p2")
+        await server.stop()
+        return first, second, server
+
+    first, second, server = asyncio.run(runner())
+
+    assert first[0] == FAIL
+    assert second == (PASS, "")
+    assert server.connections == 2
+
+
+@pytest.mark.parametrize("concurrency", [0, -1])
+def test_preflight_config_rejects_concurrency(concurrency):
+    with pytest.raises(ValueError):
+        PreflightConfig(host1="a", host2="b", concurrency=concurrency)
+
+
+def test_preflight_throughput():
+    accounts = {f"user{i}": "ok" for i in range(0, 1000, 2)}
+    lines = [f"user{i} ok" for i in range(1000)]
+
+    stats, _, _, _ = run_against(accounts, accounts, lines, concurrency=20)
+
+    assert stats.checked == 1000
+    assert stats.passed == 500
+    # Thousands of accounts per minute against a local server
+    assert stats.checked / stats.seconds * 60 > 5000
+
+
+# Test run_preflight and load_passed
+def test_run_preflight_writes_results(tmp_path):
+    input_file = tmp_path / "input.txt"
+    input_file.write_text("good p1\nbad p2\n")
+    results = tmp_path / "preflight.tsv"
+
+    async def start():
+        return await FakeIMAPServer({"good": "p1"}).start()
+
+    # Serve from a background loop so run_preflight can own its own loop
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    server = asyncio.run_coroutine_threadsafe(start(), loop).result()
+    try:
+        cfg = make_cfg(server, server)
+        cfg.results_file = str(results)
+        stats = run_preflight(str(input_file), cfg)
+    finally:
+        asyncio.run_coroutine_threadsafe(server.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+
+    assert stats.passed == 1
+    assert load_passed(str(results), "127.0.0.1", "127.0.0.1") == {("good", "good")}
+    with pytest.raises(ValueError):
+        load_passed(str(results), "127.0.0.1", "other.host")
+
+
+def test_run_preflight_invalid_file():
+    with pytest.raises(ValueError):
+        run_preflight("not_a_file", PreflightConfig(host1="a", host2="b"))
+
+
+def test_load_passed_skips_fail_and_error(tmp_path, caplog):
+    results = tmp_path / "preflight.tsv"
+    results.write_text(
+        "PASS\tgood\tgood\t\n"
+        "FAIL\tbad\tbad\thost1: NO Invalid\n"
+        "ERROR\tdown\tdown\thost2: ConnectionRefusedError: refused\n"
+    )
+
+    with caplog.at_level("WARNING"):
+        passed = load_passed(str(results))
+
+    assert passed == {("good", "good")}
+    assert any("1 accounts" in rec.message for rec in caplog.records)
+
+
+def test_generator_filters_on_preflight_results(tmp_path):
+    results = tmp_path / "preflight.tsv"
+    results.write_text(
+        "# preflight host1=imap.source.tld port1=993 host2=imap.dest.tld port2=993\n"
+        "PASS\tgood\tgood\t\n"
+        "FAIL\tbad\tbad\thost1: NO Invalid\n"
+        "ERROR\tdown\tdown\thost2: TimeoutError\n"
+        "PASS\tu1\tu2\t\n"
+    )
+    cfg = GeneratorConfig(
+        host1="imap.source.tld",
+        host2="imap.dest.tld",
+        preflight_results=str(results),
+    )
+    gen = ScriptGenerator(cfg)
+
+    out = gen.process_strings(["good p1", "bad p2", "down p3", "u1 p3 u2 p4", "new p5"])
+
+    assert len(out) == 2
+    assert "--user1 good" in out[0]
+    assert "--user1 u1" in out[1]
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        (b"[AUTHENTICATIONFAILED] Invalid", FAIL),
+        (b"Invalid credentials", FAIL),
+        (b"[UNAVAILABLE] Backend down", ERROR),
+        (b"[CONTACTADMIN] Call support", ERROR),
+        (b"[EXPIRED] Password expired", ERROR),
+    ],
+)
+def test_preflight_no_response_codes(text, expected):
+    async def runner():
+        server = await FakeIMAPServer({"u": "p"}, no_texts={"u": text}).start()
+        result = await HostPool("127.0.0.1", server.port, 1, 5.0).check("u", "p")
+        await server.stop()
+        return result
+
+    status, detail = asyncio.run(runner())
+
+    assert status == expected
+    assert detail == "NO " + text.decode()
+
+
+def test_load_passed_warns_without_header(tmp_path, caplog):
+    results = tmp_path / "preflight.tsv"
+    results.write_text("PASS\tgood\tgood\t\n")
+
+    with caplog.at_level("WARNING"):
+        passed = load_passed(str(results), "a", "b")
+
+    assert passed == {("good", "good")}
+    assert any("no preflight header" in rec.message for rec in caplog.records)
+
+
+def test_generator_rejects_preflight_for_other_hosts(tmp_path):
+    results = tmp_path / "preflight.tsv"
+    results.write_text(
+        "# preflight host1=old.tld port1=993 host2=imap.dest.tld port2=993\n"
+        "PASS\tgood\tgood\t\n"
+    )
+    cfg = GeneratorConfig(
+        host1="imap.source.tld",
+        host2="imap.dest.tld",
+        preflight_results=str(results),
+    )
+
+    with pytest.raises(ValueError, match="old.tld/imap.dest.tld"):
+        ScriptGenerator(cfg)
@@ -0,0 +1,198 @@
+import subprocess
+
+import pytest
+from src.imapsync_scriptgen.templates import job_label, render_parallel_script
+
+from .fixtures import cfg as CONFIG, gen as GEN
+
+gen = GEN
+cfg = CONFIG
+
+# Stub imapsync: fails for any --user1 containing "bad", writes to stderr for "noisy".
+# Each copy records how many copies are running at once in $STUB_DIR/counts
+STUB_IMAPSYNC = """#!/bin/sh
+touch "$STUB_DIR/running/$$"
+ls "$STUB_DIR/running" | wc -l >> "$STUB_DIR/counts"
+sleep 0.2
+rm -f "$STUB_DIR/running/$$"
+while [ $# -gt 0 ]; do
+    if [ "$1" = "--user1" ]; then
+        case "$2" in
+            *bad*) exit 11 ;;
+            *noisy*) echo "Unknown option: --bogus" >&2; exit 2 ;;
+        esac
+    fi
+    shift
+done
+exit 0
+"""
+
+
+@pytest.fixture
+def stub_path(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    stub = bin_dir / "imapsync"
+    stub.write_text(STUB_IMAPSYNC)
+    stub.chmod(0o755)
+    (tmp_path / "running").mkdir()
+    monkeypatch.setenv("PATH", f"{bin_dir}:/usr/bin:/bin")
+    monkeypatch.setenv("STUB_DIR", str(tmp_path))
+    return bin_dir
+
+
+def max_running(tmp_path):
+    return max(int(x) for x in (tmp_path / "counts").read_text().split())
+
+
+# Test job_label
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        (
+            "imapsync --user1 a --logfile=h1__h2__a--b.log --addheader",
+            "h1__h2__a--b.log",
+        ),
+        ("imapsync --user1 a", "job-3"),
+    ],
+)
+def test_job_label(line, expected):
+    assert job_label(line, 3) == expected
+
+
+# Test render_parallel_script
+def test_render_parallel_script(gen):
+    lines = gen.process_strings(["a1 p1", "a2 p2"])
+    script = render_parallel_script(lines, 4)
+
+    assert script.startswith("#!/bin/sh\n")
+    assert 'MAX_JOBS="${MAX_JOBS:-4}"' in script
+    assert "run_job 1 imap.source.tld__imap.dest.tld__a1--a1.log imapsync" in script
+    assert "run_job 2 imap.source.tld__imap.dest.tld__a2--a2.log imapsync" in script
+    assert script.rstrip().endswith('"$RESULTS_FILE"')
+
+
+def test_render_parallel_script_invalid_max_jobs():
+    with pytest.raises(ValueError):
+        render_parallel_script(["cmd"], 0)
+
+
+# Run generated scripts against the stub imapsync
+def test_parallel_script_runs_jobs(gen, tmp_path, stub_path):
+    lines = gen.process_strings(["ok1 p1", "bad1 p2", "ok2 p3", "ok3 p4", "bad2 p5"])
+    script = tmp_path / "sync_0.sh"
+    script.write_text(render_parallel_script(lines, 2))
+
+    proc = subprocess.run(
+        ["sh", str(script)], capture_output=True, text=True, timeout=30
+    )
+
+    assert proc.returncode == 1
+    assert "Summary: 5 jobs, 3 succeeded, 2 failed" in proc.stdout
+    assert "bad1--bad1.log" in proc.stdout
+
+    results = (tmp_path / "sync_0.results").read_text().splitlines()
+    statuses = {
+        job_id: status for job_id, status, _ in (r.split("\t") for r in results)
+    }
+    assert statuses == {"1": "0", "2": "11", "3": "0", "4": "0", "5": "11"}
+
+
+def test_parallel_script_all_succeed(gen, tmp_path, stub_path):
+    lines = gen.process_strings(["ok1 p1", "ok2 p2"])
+    script = tmp_path / "sync_0.sh"
+    script.write_text(render_parallel_script(lines, 1))
+    results = tmp_path / "custom.results"
+
+    proc = subprocess.run(
+        ["sh", str(script)],
+        capture_output=True,
+        text=True,
+        timeout=30,
+        env={
+            "PATH": str(stub_path) + ":/usr/bin:/bin",
+            "STUB_DIR": str(tmp_path),
+            "RESULTS_FILE": str(results),
+        },
+    )
+
+    assert proc.returncode == 0
+    assert "Summary: 2 jobs, 2 succeeded, 0 failed" in proc.stdout
+    assert len(results.read_text().splitlines()) == 2
+
+
+def test_parallel_script_caps_concurrent_jobs(gen, tmp_path, stub_path):
+    lines = gen.process_strings([f"ok{i} p{i}" for i in range(8)])
+    script = tmp_path / "sync_0.sh"
+    script.write_text(render_parallel_script(lines, 3))
+
+    proc = subprocess.run(
+        ["sh", str(script)], capture_output=True, text=True, timeout=30
+    )
+
+    assert proc.returncode == 0
+    assert "Summary: 8 jobs, 8 succeeded, 0 failed" in proc.stdout
+    # Jobs do overlap, but never more than MAX_JOBS at once
+    assert 2 <= max_running(tmp_path) <= 3
+
+
+def test_parallel_script_max_jobs_override(gen, tmp_path, stub_path, monkeypatch):
+    lines = gen.process_strings([f"ok{i} p{i}" for i in range(4)])
+    script = tmp_path / "sync_0.sh"
+    script.write_text(render_parallel_script(lines, 4))
+    monkeypatch.setenv("MAX_JOBS", "1")
+
+    proc = subprocess.run(
+        ["sh", str(script)], capture_output=True, text=True, timeout=30
+    )
+
+    assert proc.returncode == 0
+    assert max_running(tmp_path) == 1
+
+
+def test_parallel_script_keeps_stderr(gen, tmp_path, stub_path):
+    lines = gen.process_strings(["noisy1 p1", "ok1 p2"])
+    script = tmp_path / "sync_0.sh"
+    script.write_text(render_parallel_script(lines, 2))
+
+    proc = subprocess.run(
+        ["sh", str(script)], capture_output=True, text=True, timeout=30
+    )
+
+    assert proc.returncode == 1
+    assert "Unknown option: --bogus" in proc.stderr
+    assert "Summary: 2 jobs, 1 succeeded, 1 failed" in proc.stdout
+
+
+@pytest.mark.parametrize("shell", ["sh", "bash"])
+def test_parallel_script_caps_jobs_in_any_shell(gen, tmp_path, stub_path, shell):
+    lines = gen.process_strings([f"ok{i} p{i}" for i in range(8)])
+    script = tmp_path / "sync_0.sh"
+    script.write_text(render_parallel_script(lines, 2))
+
+    proc = subprocess.run(
+        [shell, str(script)], capture_output=True, text=True, timeout=30
+    )
+
+    assert proc.returncode == 0
+    assert proc.stderr == ""
+    assert "Summary: 8 jobs, 8 succeeded, 0 failed" in proc.stdout
+    assert 1 <= max_running(tmp_path) <= 2
+
+
+@pytest.mark.parametrize("max_jobs", ["0", "abc", "-1", "2x", "08"])
+def test_parallel_script_rejects_invalid_max_jobs(
+    gen, tmp_path, stub_path, monkeypatch, max_jobs
+):
+    lines = gen.process_strings(["ok1 p1"])
+    script = tmp_path / "sync_0.sh"
+    script.write_text(render_parallel_script(lines, 2))
+    monkeypatch.setenv("MAX_JOBS", max_jobs)
+
+    proc = subprocess.run(
+        ["sh", str(script)], capture_output=True, text=True, timeout=30
+    )
+
+    assert proc.returncode == 2
+    assert "MAX_JOBS must be a positive integer" in proc.stderr
+    assert not (tmp_path / "counts").exists()
@@ -1,4 +1,9 @@
-from src.imapsync_scriptgen.utils import GeneratorConfig, verify_host, batch_lines
+from src.imapsync_scriptgen.utils import (
+    GeneratorConfig,
+    PreflightConfig,
+    verify_host,
+    batch_lines,
+)
 
 
 # GeneratorConfig Tests
@@ -16,6 +21,17 @@ def test_generator_config_defaults():
     assert cfg.config == {}
 
 
+def test_preflight_config_defaults():
+    cfg = PreflightConfig(host1="a", host2="b")
+
+    assert (cfg.port1, cfg.port2) == (993, 993)
+    assert cfg.use_ssl is True
+    assert cfg.verify_ssl is True
+    assert cfg.concurrency == 20
+    assert cfg.timeout == 15.0
+    assert cfg.results_file == "preflight.tsv"
+
+
 def test_generator_config_override_values():
     cfg = GeneratorConfig(
         host1="source",